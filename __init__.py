@@ -4,149 +4,323 @@ bl_info = {
     "version": (1, 6), # Increment version number
     "blender": (4, 0, 0), # Specify minimum Blender version
     "location": "Sequencer > Strip > Transform",
-    "description": "Extends selected strip ends to the frame before the next strip in the same channel (within 1000 frames), processing by channel then time.",
+    "description": "Extends selected strip ends to the frame before the next strip in the same channel (within 5000 frames), processing by channel then time.",
     "category": "Sequencer",
 }
 
+import time
+
 import bpy
+import numpy as np
+
+# Maximum number of empty frames between two strips that will still be filled.
+MAX_GAP = 5000
+
+# Timelines with at least this many strips at the current level are analyzed in a modal loop
+# when the operator is invoked from the UI, spending up to ANALYSIS_SECONDS_PER_TICK per timer tick.
+MODAL_STRIP_THRESHOLD = 5000
+ANALYSIS_SECONDS_PER_TICK = 0.02
+
+
+def get_strips_at_level(context):
+    # The strips at the currently active meta stack level or the main timeline,
+    # the same ones context.sequences refers to. context.sequences is a plain Python list though,
+    # while the RNA collection behind it supports foreach_get for bulk reads.
+    editor = context.scene.sequence_editor
+    return editor.meta_stack[-1].sequences if editor.meta_stack else editor.sequences
+
+
+def read_strip_fields(strips):
+    # Reads channel, frame_start and frame_final_end of all strips, one foreach_get call per field.
+    # (frame_start is a float property since Blender 4.0, frame_final_end and channel are ints.)
+    n = len(strips)
+    ch = np.empty(n, dtype=np.int32)
+    fs = np.empty(n, dtype=np.float32)
+    fe = np.empty(n, dtype=np.int32)
+    strips.foreach_get('channel', ch)
+    strips.foreach_get('frame_start', fs)
+    strips.foreach_get('frame_final_end', fe)
+    return ch, fs, fe
 
 class SEQUENCER_OT_extend_to_next_strip(bpy.types.Operator):
-    """Extend selected strip end to the frame before the next strip in the same channel (within 1000 frames)"""
+    """Extend selected strip end to the frame before the next strip in the same channel (within 5000 frames)"""
     bl_idname = "sequencer.extend_to_next_strip"
     bl_label = "Extend to Next Strip in Channel"
     bl_options = {'REGISTER', 'UNDO'}
 
+    # Per-strip console logging is off by default, so the operator doesn't pay for
+    # formatting and printing on every strip.
+    verbose: bpy.props.BoolProperty(
+        name="Verbose",
+        description="Print details about every processed strip to the system console",
+        default=False,
+    )
+
     @classmethod
     def poll(cls, context):
         # Operator is available if a sequence editor exists in the current scene.
         return context.scene and context.scene.sequence_editor is not None
 
     def execute(self, context):
-        scene = context.scene
+        if not self._prepare(context):
+            self.report({'INFO'}, "No strips selected.")
+            return {'CANCELLED'}
+
+        self._analyze_channels()
+        return self._apply_writes()
 
-        # Use context.sequences and context.selected_sequences for meta stack compatibility.
-        # These properties automatically refer to the strips at the currently active
-        # meta stack level or the main timeline.
-        strips_at_level = context.sequences
-        selected_strips = context.selected_sequences
+    def invoke(self, context, event):
+        # Small timelines are handled in one go.
+        if len(get_strips_at_level(context)) < MODAL_STRIP_THRESHOLD:
+            return self.execute(context)
 
-        if not selected_strips:
+        if not self._prepare(context):
             self.report({'INFO'}, "No strips selected.")
             return {'CANCELLED'}
 
-        # --- Core Change: Sort the selected strips by channel, then by start frame ---
-        # This ensures we process strips from lowest channel up, and from left to right within each channel.
-        # Use sorted() to create a new list, avoiding modification of context.selected_sequences in-place.
-        sorted_selected_strips = sorted(selected_strips, key=lambda s: (s.channel, s.frame_start))
-        # --- End of Core Change ---
-
-
-        # Get all strips at the current meta stack level and sort them by start frame.
-        # This list is used *inside* the loop to efficiently find the *true* next strip
-        # in the same channel for the *current* strip being processed from the sorted_selected_strips list.
-        all_strips_sorted_by_time = list(strips_at_level)
-        all_strips_sorted_by_time.sort(key=lambda s: s.frame_start)
-
-        print(f"Processing {len(sorted_selected_strips)} selected strips, sorted by Channel then Start Frame...")
-
-        processed_count = 0
-
-        # Iterate over the newly sorted list of selected strips.
-        for current_strip in sorted_selected_strips:
-
-            # Find the current strip's position in the globally time-sorted list.
-            # This is needed to efficiently search for the *next* strip after it.
-            try:
-                current_index_in_all = all_strips_sorted_by_time.index(current_strip)
-            except ValueError:
-                 # This can happen if a selected strip was somehow removed or isn't in the active context.sequences list.
-                 print(f"Warning: Selected strip '{current_strip.name}' not found in the active sequence editor sequences list. Skipping.")
-                 continue
-
-
-            print(f"\nChecking strip: {current_strip.name} (Start: {current_strip.frame_start}, End: {current_strip.frame_final_end}, Channel: {current_strip.channel})")
-
-            # Find the first strip in the same channel that starts *after* the current strip's *current* end frame.
-            next_strip = None
-            # Start searching from the strip *after* the current one in the global time-sorted list.
-            for i in range(current_index_in_all + 1, len(all_strips_sorted_by_time)):
-                potential_next = all_strips_sorted_by_time[i]
-
-                # Check if the potential next strip is in the same channel
-                # AND starts strictly after the current strip's *final* end frame.
-                # (Using frame_final_end reflects the strip's current presence on the timeline)
-                if potential_next.channel == current_strip.channel and \
-                   potential_next.frame_start > current_strip.frame_final_end:
-                    next_strip = potential_next
-                    # Found the first chronological next strip in the same channel that starts *after* the current one ends.
-                    break # Stop searching for this current_strip's successor.
-
-            if next_strip:
-                # Log details about the found next strip.
-                print(f"  Found potential next strip in same channel: {next_strip.name} (Start: {next_strip.frame_start}, Channel: {next_strip.channel})")
-
-                # Calculate the number of empty frames between the current strip's end and the next strip's start.
-                # If strip A ends at frame 100 (frame_final_end=100) and strip B starts at frame 102 (frame_start=102),
-                # the gap frames are frame 101, which is 1 frame.
-                # Gap frames = next_strip.frame_start - (current_strip.frame_final_end + 1)
-                num_gap_frames = next_strip.frame_start - (current_strip.frame_final_end + 1)
-
-                print(f"  Current Strip End Frame (inclusive): {current_strip.frame_final_end}")
-                print(f"  Next Strip Start Frame: {next_strip.frame_start}")
-                print(f"  Calculated Gap (number of frames between): {num_gap_frames} frames")
-
-                # Define the maximum gap allowed for extension.
-                max_gap = 5000
-
-                # Check the gap condition: must be positive (a gap exists) and within the maximum allowed range.
-                # A positive number of gap frames means there's space.
-                if num_gap_frames > 0 and num_gap_frames <= max_gap:
-                    print(f"  Gap of {num_gap_frames} frames is within (0, {max_gap}] range. Extending strip.")
-
-                    # The target end frame is the frame immediately before the next strip starts.
-                    # Since frame_final_end is inclusive, setting it to `next_strip.frame_start - 1`
-                    # will make the current strip end exactly one frame before the next one begins, filling the gap.
-                    target_end_frame = next_strip.frame_start - 1
-
-                    # *** Ensure the target end frame is an integer using rounding ***
-                    # Even though frame_start and frame_final_end are typically integers,
-                    # intermediate calculations or how Blender stores them internally might result in floats.
-                    # We need a strict integer for frame_final_end.
-                    target_end_frame_int = int(round(target_end_frame))
-
-                    # Calculate the potential new duration. This should be >= 1 if target_end_frame_int >= current_strip.frame_start.
-                    new_duration_potential = target_end_frame_int - current_strip.frame_start + 1
-
-                    # Ensure the calculated new duration is valid (at least 1 frame)
-                    # and that the target end frame is not before the strip's start.
-                    if new_duration_potential > 0:
-                        # --- Apply the new end frame ---
-
-                        # Set the frame_final_end property. Blender handles duration and source offset adjustments internally
-                        # when this property is set for common strip types (Movie, Image, Sound).
-                        current_strip.frame_final_end = target_end_frame_int
-
-                        # Log the successful extension details.
-                        # Get the actual frame_final_end and duration after Blender updates them.
-                        actual_new_end_frame = current_strip.frame_final_end
-                        actual_new_duration = current_strip.frame_final_duration
-                        print(f"  Successfully extended '{current_strip.name}' to end at frame {actual_new_end_frame}. New duration: {actual_new_duration}")
-                        processed_count += 1
-                    else:
-                        # This case indicates an unexpected calculation resulting in an invalid target end frame or duration.
-                         print(f"  Calculated target end frame {target_end_frame_int} results in non-positive duration. No change needed.")
+        # Large timelines are analyzed in a modal loop, so the UI stays responsive and the operator
+        # can be cancelled. Only plain indices and arrays are kept between timer ticks, and all writes
+        # still happen together once the analysis is done.
+        # The collection itself is fetched again by _strips_unchanged right before writing.
+        self._strips = None
+        wm = context.window_manager
+        wm.progress_begin(0, len(self._chan_slices))
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type in {'ESC', 'RIGHTMOUSE'}:
+            # Nothing has been written yet, so cancelling leaves the strips untouched.
+            self._end_modal(context)
+            self.report({'INFO'}, "Cancelled. No strips were extended.")
+            return {'CANCELLED'}
 
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
 
-                else:
-                    # Log why the strip was not extended (gap is too large, zero, or negative/overlapping).
-                    # Round the number of gap frames for cleaner logging output.
-                    # Handle potentially very large gaps gracefully in logging.
-                    log_gap = int(round(num_gap_frames)) if abs(num_gap_frames) < 2000 else num_gap_frames
-                    print(f"  Calculated Gap {log_gap} frames is not within (0, {max_gap}] range or is not positive (overlapping/touching). No extension needed.")
+        if self._next_channel < len(self._chan_slices):
+            self._analyze_channels(time.perf_counter() + ANALYSIS_SECONDS_PER_TICK)
+            context.window_manager.progress_update(self._next_channel)
+            return {'RUNNING_MODAL'}
+
+        self._end_modal(context)
 
-            else:
-                # Log if no subsequent strip was found in the same channel that starts AFTER the current strip ends.
-                print(f"  No subsequent strip found in the same channel that starts after this one ends.")
+        # The timeline may have been edited or undone while the analysis ran. Only write if the strips
+        # are unchanged, so the stored collection indices still refer to the strips they were computed for.
+        if not self._strips_unchanged(context):
+            self.report({'WARNING'}, "Strips changed while the operator was running. No strips were extended.")
+            return {'CANCELLED'}
+
+        return self._apply_writes()
+
+    def _end_modal(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+
+    def _strips_unchanged(self, context):
+        # Re-reads the strips at the current level and compares them with the snapshot taken by _prepare.
+        # On a match, the freshly fetched collection is used for the writes.
+        if context.scene.sequence_editor is None:
+            return False
+        strips_at_level = get_strips_at_level(context)
+        if len(strips_at_level) != self._strip_count:
+            return False
+        current = read_strip_fields(strips_at_level)
+        if not all(np.array_equal(a, b) for a, b in zip(current, self._snapshot)):
+            return False
+        self._strips = strips_at_level
+        return True
+
+    def _prepare(self, context):
+        # Reads the strips at the current level into sorted NumPy arrays on the operator.
+        # Returns False if there is nothing selected.
+        strips_at_level = get_strips_at_level(context)
+
+        # Snapshot the fields the algorithm needs into NumPy arrays, one foreach_get call per field.
+        # Every RNA attribute access crosses into Blender's C API, so the search below only works on
+        # these plain arrays, and RNA is touched again only for the strips that actually change.
+        # Strips are referred to by their index in the collection, so no Python wrapper object is
+        # created for strips that are not written to.
+        n = len(strips_at_level)
+        snapshot = read_strip_fields(strips_at_level)
+        ch, fs, fe = snapshot
+        sel = np.empty(n, dtype=bool)
+        # The strips at this level with their select flag set are exactly context.selected_sequences.
+        strips_at_level.foreach_get('select', sel)
+
+        if not sel.any():
+            return False
+
+        # Loop invariants, read once instead of on every iteration below.
+        verbose = self.verbose
+
+        # Sort by channel, then by start frame, so each channel occupies a contiguous slice of the arrays.
+        # When the whole selection is in one channel (the common case), only that channel's strips are
+        # kept and sorted, which skips sorting and bucketing all the other channels.
+        # Strips starting before the first selected strip, or too far after the last selected strip's end
+        # to be within MAX_GAP of it, can never be the next strip that gets extended to, so they are
+        # dropped before sorting. On long timelines with a local edit this leaves only a few strips.
+        window = (fs >= fs[sel].min()) & (fs <= fe[sel].max() + MAX_GAP + 1)
+        sel_ch = ch[sel]
+        if sel_ch.min() == sel_ch.max():
+            in_channel = np.flatnonzero(window & (ch == sel_ch[0]))
+            order = in_channel[np.argsort(fs[in_channel], kind='stable')]
+        else:
+            in_window = np.flatnonzero(window)
+            order = in_window[np.lexsort((fs[in_window], ch[in_window]))]
+        n = len(order)
+        ch, fs, fe, sel = ch[order], fs[order], fe[order], sel[order]
+
+        # Start frames as int32 like the other columns, so searchsorted compares same-typed arrays
+        # and never has to cast a channel's start frames. Rounding up keeps every comparison against
+        # the integer end frames exactly as it is with the float values; the target end frames are
+        # still taken from the float start frames.
+        fs_int = np.ceil(fs).astype(np.int32)
+
+        # The channel slices start wherever the sorted channel number changes,
+        # which needs no second sort of the channel column (as np.unique would do).
+        chan_lo = np.concatenate(([0], np.flatnonzero(ch[1:] != ch[:-1]) + 1))
+        chan_hi = np.append(chan_lo[1:], n)
+        chans = ch[chan_lo]
+
+        if verbose:
+            print(f"Processing {np.count_nonzero(sel)} selected strips, sorted by Channel then Start Frame...")
+
+        self._verbose = verbose
+        self._strips = strips_at_level
+        # The unsorted fields as read, so a modal run can check the strips haven't changed before writing.
+        self._snapshot = snapshot
+        # Number of strips at this level before any filtering.
+        self._strip_count = len(strips_at_level)
+        self._order = order
+        self._ch, self._fs, self._fs_int, self._fe, self._sel = ch, fs, fs_int, fe, sel
+        # Only channels with a selected strip that is not the last one in its channel need to be analyzed,
+        # since the last strip in a channel never has a next strip to extend to.
+        sel_not_last = sel.copy()
+        sel_not_last[chan_hi - 1] = False
+        has_candidates = np.add.reduceat(sel_not_last, chan_lo) > 0
+        self._chan_slices = [(int(c), int(lo), int(hi))
+                             for c, lo, hi, keep in zip(chans, chan_lo, chan_hi, has_candidates) if keep]
+        # (collection index, new end frame) pairs collected by the analysis, applied all at once at the end.
+        self._writes = []
+        # Index into self._chan_slices of the next channel to analyze.
+        self._next_channel = 0
+
+        if verbose:
+            # Strip names for the console output, as plain strings so nothing from RNA is held between modal ticks.
+            self._names = [s.name for s in strips_at_level]
+            # Selected strips that are last in their channel are not analyzed, log them here.
+            for i in np.flatnonzero(sel & ~sel_not_last):
+                self._log_checking(i)
+                print(f"  No subsequent strip found in the same channel that starts within {MAX_GAP} frames after this one ends.")
+        return True
+
+    def _log_checking(self, i):
+        # Prints the header line for the strip at position i of the sorted arrays.
+        print(f"\nChecking strip: {self._names[self._order[i]]} (Start: {self._fs[i]}, End: {self._fe[i]}, Channel: {self._ch[i]})")
+
+    def _analyze_channel(self, channel, lo, hi):
+        # Computes the gaps for all strips of one channel at once and queues the writes
+        # for the selected strips that can be extended. No strip is touched here.
+        c_fs, c_fs_int = self._fs[lo:hi], self._fs_int[lo:hi]
+        c_fe, c_sel = self._fe[lo:hi], self._sel[lo:hi]
+        c_count = hi - lo
+
+        # Only the selected strips before the last one in the channel can have a next strip,
+        # so the remaining work is done just for those.
+        cand = np.flatnonzero(c_sel[:-1])
+        cand_fs, cand_fe = c_fs[cand], c_fe[cand]
+
+        # For every candidate, the index of the first strip in the same channel that starts *after* its end frame.
+        # (Using frame_final_end reflects the strip's current presence on the timeline)
+        # No earlier strip can start after the candidate's end, so this is a merge of the candidates
+        # with the channel: the answer is usually the strip right after the candidate. Only candidates
+        # whose neighbour doesn't start after their end (touching or overlapping it, which is skipped
+        # just like the strip-by-strip search did) need a binary search further along the channel.
+        next_idx = cand + 1
+        behind = c_fs_int[next_idx] <= cand_fe
+        if behind.any():
+            next_idx[behind] = np.searchsorted(c_fs_int, cand_fe[behind], side='right')
+        has_next = next_idx < c_count
+        next_idx = np.minimum(next_idx, c_count - 1)
+
+        # Number of empty frames between each strip's end and the next strip's start.
+        # If strip A ends at frame 100 (frame_final_end=100) and strip B starts at frame 102 (frame_start=102),
+        # the gap frames are frame 101, which is 1 frame.
+        gaps = c_fs_int[next_idx] - (cand_fe + 1)
+
+        # The target end frame is the frame immediately before the next strip starts.
+        # Since frame_final_end is inclusive, setting it to `next_strip.frame_start - 1`
+        # will make the current strip end exactly one frame before the next one begins, filling the gap.
+        # frame_start is a float property, but strips start on whole frames, so truncating it to int
+        # gives the strict integer frame_final_end needs without a rounding step.
+        targets = c_fs[next_idx].astype(np.int32) - 1
+
+        # A candidate is extended if the gap is positive and within the maximum allowed range,
+        # the new duration stays at least 1 frame, and the end frame actually changes.
+        extendable = (has_next & (gaps > 0) & (gaps <= MAX_GAP)
+                      & (targets - cand_fs + 1 > 0) & (targets != cand_fe))
+
+        order = self._order
+        if self._verbose:
+            # Explain the decision for every candidate, from the arrays computed above.
+            for k in range(len(cand)):
+                self._log_checking(lo + cand[k])
+                if not has_next[k]:
+                    print(f"  No subsequent strip found in the same channel that starts within {MAX_GAP} frames after this one ends.")
+                    continue
+                next_start = c_fs[next_idx[k]]
+                gap = next_start - (cand_fe[k] + 1)
+                print(f"  Found potential next strip in same channel: {self._names[order[lo + next_idx[k]]]} (Start: {next_start}, Channel: {channel})")
+                print(f"  Current Strip End Frame (inclusive): {cand_fe[k]}")
+                print(f"  Next Strip Start Frame: {next_start}")
+                print(f"  Calculated Gap (number of frames between): {gap} frames")
+                if not (gaps[k] > 0 and gaps[k] <= MAX_GAP):
+                    print(f"  Calculated Gap {gap} frames is not within (0, {MAX_GAP}] range or is not positive (overlapping/touching). No extension needed.")
+                elif targets[k] - cand_fs[k] + 1 <= 0:
+                    print(f"  Calculated target end frame {targets[k]} results in non-positive duration. No change needed.")
+                elif targets[k] == cand_fe[k]:
+                    print(f"  Strip already ends at target end frame {targets[k]}. No change needed.")
+                else:
+                    print(f"  Gap of {gap} frames is within (0, {MAX_GAP}] range. Extending strip to end at frame {targets[k]}.")
+
+        self._writes.extend((int(order[lo + cand[k]]), int(targets[k])) for k in np.nonzero(extendable)[0])
+
+    def _analyze_channels(self, deadline=None):
+        # Analyzes the channels from self._next_channel on, until all are done
+        # or the time.perf_counter() `deadline` has passed.
+        chan_slices = self._chan_slices
+        while self._next_channel < len(chan_slices):
+            self._analyze_channel(*chan_slices[self._next_channel])
+            self._next_channel += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+
+    def _apply_writes(self):
+        verbose = self._verbose
+
+        # --- Application: set all new end frames in one tight loop ---
+        # A strip's Python wrapper is only created here, for the strips that are actually written to.
+        strips = self._strips
+        if verbose:
+            print(f"\nApplying {len(self._writes)} new end frame(s)...")
+        for strip_index, target_end_frame_int in self._writes:
+            current_strip = strips[strip_index]
+
+            # Set the frame_final_end property. Blender handles duration and source offset adjustments internally
+            # when this property is set for common strip types (Movie, Image, Sound).
+            current_strip.frame_final_end = target_end_frame_int
+
+            # Log the successful extension details.
+            # Get the actual frame_final_end and duration after Blender updates them.
+            if verbose:
+                actual_new_end_frame = current_strip.frame_final_end
+                actual_new_duration = current_strip.frame_final_duration
+                print(f"  Successfully extended '{current_strip.name}' to end at frame {actual_new_end_frame}. New duration: {actual_new_duration}")
+
+        processed_count = len(self._writes)
 
         # Report the final summary using Blender's built-in reporting system (appears in the info bar).
         if processed_count > 0:
@@ -155,7 +329,8 @@ class SEQUENCER_OT_extend_to_next_strip(bpy.types.Operator):
              self.report({'INFO'}, "Script finished. No selected strips were extended.")
 
         # Print final summary to the console/system console as well.
-        print(f"\nScript finished. Extended {processed_count} selected strip(s).")
+        if verbose:
+            print(f"\nScript finished. Extended {processed_count} selected strip(s).")
 
         # Indicate that the operation finished successfully.
         return {'FINISHED'}